@@ -73,27 +73,35 @@ export default function ChatRoom() {
       }
     };
     
-    // Handle user joined notification
+    // Handle user joined notification (delta: apply to local roster)
     const handleUserJoined = (data) => {
       if (data.room === currentRoom) {
-        setParticipants(data.participants || []);
+        setParticipants(prev => (prev.includes(data.sid) ? prev : [...prev, data.sid]));
         addSystemMessage(currentRoom, `User ${data.sid.substring(0, 8)} joined`, data.timestamp);
       }
     };
     
-    // Handle user left notification
+    // Handle user left notification (delta: apply to local roster)
     const handleUserLeft = (data) => {
       if (data.room === currentRoom) {
-        setParticipants(data.participants || []);
+        setParticipants(prev => prev.filter(sid => sid !== data.sid));
         addSystemMessage(currentRoom, `User ${data.sid.substring(0, 8)} left`, data.timestamp);
       }
     };
     
-    // Handle incoming messages
+    // Handle full roster (used for reconciliation)
+    const handleParticipantsList = (data) => {
+      if (data.room === currentRoom) {
+        setParticipants(data.participants || []);
+      }
+    };
+    
+    // Add a single incoming chat message (called for each entry of a batch)
     const handleMessage = (data) => {
       if (data.room === currentRoom) {
         addMessage(data.room, {
-          id: `${data.sid}-${data.timestamp}`,
+          // Server id is unique; sid+timestamp can collide within one millisecond
+          id: data.id ?? `${data.sid}-${data.timestamp}`,
           message: data.message,
           sid: data.sid,
           username: data.username || `User_${data.sid.substring(0, 8)}`,
@@ -103,6 +111,11 @@ export default function ChatRoom() {
       }
     };
     
+    // Handle batched messages (server coalesces room messages per flush tick)
+    const handleMessageBatch = (batch) => {
+      (batch || []).forEach(handleMessage);
+    };
+    
     // Handle errors
     const handleError = (data) => {
       console.error('Socket error:', data.message);
@@ -114,7 +127,8 @@ export default function ChatRoom() {
     socket.on('joined', handleJoined);
     socket.on('user_joined', handleUserJoined);
     socket.on('user_left', handleUserLeft);
-    socket.on('message', handleMessage);
+    socket.on('participants_list', handleParticipantsList);
+    socket.on('message_batch', handleMessageBatch);
     socket.on('error', handleError);
     
     // Cleanup on unmount
@@ -122,7 +136,8 @@ export default function ChatRoom() {
       socket.off('joined', handleJoined);
       socket.off('user_joined', handleUserJoined);
       socket.off('user_left', handleUserLeft);
-      socket.off('message', handleMessage);
+      socket.off('participants_list', handleParticipantsList);
+      socket.off('message_batch', handleMessageBatch);
       socket.off('error', handleError);
     };
   }, [currentRoom]);
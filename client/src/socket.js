@@ -1,4 +1,5 @@
 import { io } from 'socket.io-client';
+import msgpackParser from 'socket.io-msgpack-parser';
 
 /**
  * Shared Socket.IO client instance
@@ -28,6 +29,9 @@ const getApiUrl = () => {
 const apiUrl = getApiUrl();
 console.log('Socket.IO connecting to:', apiUrl);
 
+// Must match the server's SOCKETIO_SERIALIZER setting
+const useMsgpack = process.env.REACT_APP_SOCKETIO_PARSER === 'msgpack';
+
 const socket = io(apiUrl, {
   // Connection options
   transports: ['websocket', 'polling'],
@@ -38,6 +42,8 @@ const socket = io(apiUrl, {
   timeout: 20000,
   // Use path if proxying through webpack dev server
   path: window.location.port === '8080' ? '/socket.io' : undefined,
+  // Binary msgpack packets instead of JSON text (falls back to the default parser)
+  parser: useMsgpack ? msgpackParser : undefined,
 });
 
 // Connection status tracking
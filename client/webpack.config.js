@@ -1,4 +1,5 @@
 const path = require('path');
+const webpack = require('webpack');
 const HtmlWebpackPlugin = require('html-webpack-plugin');
 
 module.exports = (env, argv) => {
@@ -40,6 +41,10 @@ module.exports = (env, argv) => {
         template: './index.html',
         inject: 'body',
       }),
+      // Inline the Socket.IO parser choice into the bundle (must match SOCKETIO_SERIALIZER)
+      new webpack.DefinePlugin({
+        'process.env.REACT_APP_SOCKETIO_PARSER': JSON.stringify(process.env.REACT_APP_SOCKETIO_PARSER || ''),
+      }),
     ],
     devServer: {
       static: {
@@ -1,13 +1,27 @@
 import os
+from dotenv import load_dotenv
+
+# Load environment variables from .env file if it exists.
+# This runs before patching so ASYNC_MODE from .env is honoured.
+load_dotenv()
+
+# Explicitly configure async_mode for production consistency
+# eventlet is preferred for better performance with Socket.IO
+async_mode = os.getenv('ASYNC_MODE', 'eventlet')
+
+# eventlet must patch the standard library before Flask and the rest of the app
+# are imported, otherwise blocking calls stall the whole hub instead of yielding.
+# python-dotenv is safe to load before patching.
+if async_mode == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+
 import logging
+import orjson
 from flask import Flask
 from flask_socketio import SocketIO
-from dotenv import load_dotenv
 import chat_events
 
-# Load environment variables from .env file if it exists
-load_dotenv()
-
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -19,9 +33,6 @@ app = Flask(__name__)
 # Load SECRET_KEY from environment variable with fallback
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'secret-dev-key-change-in-production')
 
-# Explicitly configure async_mode for production consistency
-# eventlet is preferred for better performance with Socket.IO
-async_mode = os.getenv('ASYNC_MODE', 'eventlet')
 logger.info(f'Initializing Socket.IO with async_mode: {async_mode}')
 
 # Configure CORS for React dev server and production
@@ -37,12 +48,46 @@ cors_origins = '*' if os.getenv('DEBUG', 'False').lower() == 'true' else allowed
 
 logger.info(f'CORS allowed origins: {cors_origins if cors_origins != "*" else "all (development mode)"}')
 
+# Wire format for Socket.IO packets: 'default' (JSON text) or 'msgpack' (binary).
+# msgpack requires clients to use the matching parser (REACT_APP_SOCKETIO_PARSER=msgpack)
+socketio_serializer = os.getenv('SOCKETIO_SERIALIZER', 'default')
+if socketio_serializer not in ('default', 'msgpack'):
+    raise ValueError(
+        f"Invalid SOCKETIO_SERIALIZER {socketio_serializer!r}: expected 'default' or 'msgpack'"
+    )
+logger.info(f'Socket.IO packet serializer: {socketio_serializer}')
+
+# Per-packet Socket.IO/Engine.IO logging is off unless explicitly requested
+socketio_debug = os.getenv('SOCKETIO_DEBUG', 'False').lower() == 'true'
+
+
+class OrJSON:
+    """Minimal json-module shim so python-socketio encodes packets with orjson"""
+
+    @staticmethod
+    def dumps(obj, **kwargs):
+        # kwargs such as separators are ignored; orjson always emits compact output
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return orjson.loads(s)
+
+
 socketio = SocketIO(
     app,
+    json=OrJSON,
+    serializer=socketio_serializer,
     cors_allowed_origins=cors_origins,
     async_mode=async_mode,
-    logger=logger.getEffectiveLevel() <= logging.DEBUG,
-    engineio_logger=logger.getEffectiveLevel() <= logging.DEBUG
+    logger=socketio_debug,
+    engineio_logger=socketio_debug,
+    # Run handlers inline on each connection's receive loop instead of spawning a
+    # greenlet per event. 'message' only buffers (the chat_events flusher drains
+    # each room in order), but join/leave/disconnect run their broadcast_to_room
+    # fan-out, including the chunked sleep(0) path, on this loop: the client's
+    # next event waits until the handler returns, so never block in a handler.
+    async_handlers=False
 )
 
 # Initialize Socket.IO event handlers
@@ -6,134 +6,399 @@ This module defines all Socket.IO event handlers including:
 - test_message handler for debugging
 - join/leave room handlers with participant tracking
 - message handlers for chat functionality with timestamps and sender IDs
+- a background flusher that coalesces chat messages into per-room batches
 """
 from flask_socketio import join_room, leave_room, emit
 from flask import request
-from datetime import datetime
+from datetime import datetime, timezone
 from collections import defaultdict
+from functools import lru_cache, wraps
+import itertools
+import logging
+import threading
+import time
 
 # SocketIO instance - set during initialization
 socketio = None
 # Logger instance - set during initialization
 logger = None
 
-# Participant tracking: room_name -> set of session IDs
-room_participants = defaultdict(set)
+# Maximum number of tracked rooms; joins that would create a new room beyond this are rejected
+MAX_ROOMS = 100_000
+# Maximum accepted room name length
+MAX_ROOM_NAME_LENGTH = 100
+# Raw input above this (name plus surrounding whitespace) is rejected without stripping
+MAX_RAW_ROOM_NAME_LENGTH = 2 * MAX_ROOM_NAME_LENGTH
+# Rosters up to this size are kept as a list; larger ones are promoted to a set
+ROSTER_SET_THRESHOLD = 32
+
+
+class Roster:
+    """
+    Set-like collection of session IDs in a room.
+    
+    Small rooms (the common case) are stored as a list and scanned linearly,
+    which is more compact than a set. Once a room grows past
+    ROSTER_SET_THRESHOLD members the storage is promoted to a set.
+    """
+    __slots__ = ('_data',)
+    
+    def __init__(self):
+        self._data = []
+    
+    def __contains__(self, sid):
+        return sid in self._data
+    
+    def __iter__(self):
+        return iter(self._data)
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def add(self, sid):
+        data = self._data
+        if type(data) is list:
+            if sid in data:
+                return
+            if len(data) >= ROSTER_SET_THRESHOLD:
+                self._data = data = set(data)
+            else:
+                data.append(sid)
+                return
+        data.add(sid)
+    
+    def discard(self, sid):
+        data = self._data
+        if type(data) is list:
+            if sid in data:
+                data.remove(sid)
+        else:
+            data.discard(sid)
+    
+    def to_list(self):
+        """Return the members as a new list"""
+        return list(self._data)
+
+
+@lru_cache(maxsize=4096)
+def _intern_room(room):
+    return room
+
+
+def normalize_room(raw):
+    """
+    Validate and normalize a client-supplied room name.
+    
+    Oversized input is rejected before any string work, and only names that
+    pass validation are cached, so repeated joins/messages for the same room
+    reuse one interned string object without letting clients pin arbitrary
+    input in the cache. Returns None for invalid names.
+    """
+    if not isinstance(raw, str):
+        raw = str(raw)
+    if len(raw) > MAX_RAW_ROOM_NAME_LENGTH:
+        return None
+    room = raw.strip()
+    if not 0 < len(room) <= MAX_ROOM_NAME_LENGTH:
+        return None
+    return _intern_room(room)
+
+
+# Participant tracking: room_name -> Roster of session IDs
+room_participants = defaultdict(Roster)
 # Client room tracking: session_id -> set of room names
 client_rooms = defaultdict(set)
+# Minimum seconds between full tracebacks logged for the same exception type
+TRACE_INTERVAL = 60
+# Exception type -> monotonic time its last traceback was logged
+_seen_errs = {}
+# Static part of the 'connected' greeting; only 'sid' varies per client
+_CONNECTED_TEMPLATE = {'message': 'Connected to server', 'status': 'success'}
+# Shared empty sentinel for read-only lookups (avoids defaultdict auto-insert)
+_EMPTY = frozenset()
+# Server-assigned chat message ids (unique per process, increasing in send order)
+_message_ids = itertools.count(1)
+
+# Message batching: room_name -> list of messages waiting for the next flush
+pending = defaultdict(list)
+# Guards swapping/spilling of the pending buffer
+pending_lock = threading.Lock()
+# Seconds between batch flushes (bounds added delivery latency)
+FLUSH_INTERVAL = 0.025
+# Maximum messages emitted per room per flush; the remainder spills to the next tick
+MAX_BATCH_SIZE = 128
+# Rooms larger than this are broadcast in chunks, yielding to the hub in between
+BROADCAST_CHUNK_SIZE = 50
+# Seconds between stale-room/phantom-participant sweeps
+GC_INTERVAL = 30
+
+
+def take_pending_batches():
+    """
+    Swap out the pending buffer and return this tick's batches (room -> messages).
+    At most MAX_BATCH_SIZE messages are taken per room; the remainder is put
+    back at the front of the new buffer so order is preserved across ticks.
+    """
+    global pending
+    with pending_lock:
+        if not pending:
+            return {}
+        to_send, pending = pending, defaultdict(list)
+        # Spill anything over the per-tick cap back to the front of the buffer
+        for room, msgs in to_send.items():
+            if len(msgs) > MAX_BATCH_SIZE:
+                pending[room] = msgs[MAX_BATCH_SIZE:]
+                del msgs[MAX_BATCH_SIZE:]
+    return to_send
+
+
+def _noop(*args, **kwargs):
+    """Stand-in for log methods when no logger is configured"""
+
+
+def _should_trace(exc_type):
+    """
+    Return True if a full traceback should be logged for this exception type.
+    Outside DEBUG level, tracebacks are logged at most once per TRACE_INTERVAL
+    per type, so floods of malformed events only produce one-line errors.
+    """
+    if logger and logger.isEnabledFor(logging.DEBUG):
+        return True
+    now = time.monotonic()
+    last = _seen_errs.get(exc_type)
+    if last is not None and now - last < TRACE_INTERVAL:
+        return False
+    _seen_errs[exc_type] = now
+    return True
+
+
+def _log_error(exc, msg, *args):
+    """
+    Log an exception as '<msg>: <exc>'; the full traceback is gated by
+    _should_trace(). No-op when no logger is configured.
+    """
+    if logger:
+        logger.error(msg + ': %s', *args, exc, exc_info=_should_trace(type(exc)))
+
+
+def safe_handler(event_name, error_message=None):
+    """
+    Decorator that logs exceptions raised by a Socket.IO handler.
+    
+    Args:
+        event_name: Event name used in the log message
+        error_message: If given, emitted to the client as an 'error' event
+    """
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(*args, **kwargs):
+            try:
+                return handler(*args, **kwargs)
+            except Exception as e:
+                _log_error(e, 'Error handling %s event', event_name)
+                if error_message:
+                    emit('error', {'message': error_message})
+        return wrapper
+    return decorator
 
 
 def init_events(sio, log=None):
     """
     Initialize Socket.IO event handlers with socketio instance.
+    Handlers are registered at most once per SocketIO instance; repeated calls
+    are ignored so events are never delivered twice.
     
     Args:
         sio: SocketIO instance from Flask-SocketIO
         log: Logger instance (optional)
     """
     global socketio, logger
+    if socketio is sio:
+        if log:
+            log.warning('Socket.IO event handlers already registered; skipping')
+        return
     socketio = sio
     logger = log
     
-    if logger:
-        logger.info('Registering Socket.IO event handlers')
+    # Bind log methods once; without a logger they are no-ops (no print/stdio locking)
+    _info = logger.info if logger else _noop
+    _debug = logger.debug if logger else _noop
+    _warn = logger.warning if logger else _noop
+    
+    _info('Registering Socket.IO event handlers')
     
     # ========== HELPER FUNCTIONS ==========
     
+    # Last formatted timestamp as one (epoch_ms, iso_string) tuple. It is replaced
+    # in a single assignment so concurrent readers never see a half-updated pair.
+    _last_ts = (0, '')
+    
     def get_timestamp():
-        """Get current timestamp in ISO format"""
-        return datetime.utcnow().isoformat() + 'Z'
+        """Get current timestamp in ISO format (cached at millisecond granularity)"""
+        nonlocal _last_ts
+        now_ms = time.time_ns() // 1_000_000
+        cached = _last_ts
+        if cached[0] == now_ms:
+            return cached[1]
+        dt = datetime.fromtimestamp(now_ms / 1000, timezone.utc).replace(tzinfo=None)
+        iso = dt.isoformat(timespec='milliseconds') + 'Z'
+        _last_ts = (now_ms, iso)
+        return iso
     
     def add_participant_to_room(room, sid):
         """Add a participant to a room and track the relationship"""
         room_participants[room].add(sid)
         client_rooms[sid].add(room)
-        if logger:
-            logger.debug(f'Added {sid} to room {room}. Room now has {len(room_participants[room])} participants')
+        _debug('Added %s to room %s. Room now has %s participants', sid, room, len(room_participants[room]))
     
     def remove_participant_from_room(room, sid):
         """Remove a participant from a room and clean up empty rooms"""
-        room_participants[room].discard(sid)
-        client_rooms[sid].discard(room)
-        
-        # Clean up empty room
-        if not room_participants[room]:
-            del room_participants[room]
+        # .get/.pop avoid the defaultdict auto-insert path entirely
+        roster = room_participants.get(room)
+        if roster is not None:
+            roster.discard(sid)
+            # Clean up empty room
+            if not roster:
+                room_participants.pop(room, None)
         
-        # Clean up client if no rooms
-        if not client_rooms[sid]:
-            del client_rooms[sid]
+        rooms = client_rooms.get(sid)
+        if rooms is not None:
+            rooms.discard(room)
+            # Clean up client if no rooms
+            if not rooms:
+                client_rooms.pop(sid, None)
         
-        if logger:
-            logger.debug(f'Removed {sid} from room {room}')
+        _debug('Removed %s from room %s', sid, room)
     
     def get_room_participants(room):
         """Get list of participant session IDs in a room"""
-        return list(room_participants.get(room, set()))
+        roster = room_participants.get(room)
+        return roster.to_list() if roster is not None else []
+    
+    def broadcast_to_room(event, payload, room, skip_sid=None):
+        """
+        Broadcast an event to a room without monopolizing the event loop.
+        Small rooms use a single room emit; large rooms are sent in chunks of
+        sids (one emit, and so one packet encode, per chunk) with a cooperative
+        yield between chunks.
+        """
+        participants = room_participants.get(room)
+        if not participants or len(participants) <= BROADCAST_CHUNK_SIZE:
+            socketio.emit(event, payload, room=room, skip_sid=skip_sid)
+            return
+        
+        # Snapshot recipients since the room may change while we yield
+        recipients = [sid for sid in participants if sid != skip_sid]
+        sio_emit = socketio.emit
+        sio_sleep = socketio.sleep
+        for start in range(0, len(recipients), BROADCAST_CHUNK_SIZE):
+            sio_emit(event, payload, to=recipients[start:start + BROADCAST_CHUNK_SIZE])
+            sio_sleep(0)
     
     def cleanup_client_rooms(sid):
         """Remove client from all rooms on disconnect"""
-        rooms_to_leave = list(client_rooms.get(sid, set()))
+        rooms_to_leave = list(client_rooms.get(sid, _EMPTY))
+        timestamp = get_timestamp()
         for room in rooms_to_leave:
             remove_participant_from_room(room, sid)
-            leave_room(room)
+            leave_room(room, sid=sid)
+            # Nobody left to notify
+            if room not in room_participants:
+                continue
             # Notify room members
-            emit('user_left', {
+            broadcast_to_room('user_left', {
                 'room': room,
                 'sid': sid,
-                'timestamp': get_timestamp(),
-                'participants': get_room_participants(room)
-            }, room=room, skip_sid=sid)
+                'timestamp': timestamp
+            }, room, skip_sid=sid)
         return rooms_to_leave
     
+    def flush_pending_messages():
+        """
+        Background task that periodically broadcasts buffered chat messages.
+        Each room receives at most one 'message_batch' event per tick, and
+        messages are delivered in the order they were queued.
+        """
+        while True:
+            socketio.sleep(FLUSH_INTERVAL)
+            for room, msgs in take_pending_batches().items():
+                try:
+                    broadcast_to_room('message_batch', msgs, room)
+                except Exception as e:
+                    _log_error(e, 'Error flushing messages for room %s', room)
+    
+    def purge_stale_rooms():
+        """
+        Drop empty rooms and participants Socket.IO no longer has in the room
+        (e.g. half-closed connections whose disconnect never fired).
+        Returns the number of phantom participants removed.
+        """
+        sio_rooms = socketio.server.manager.rooms.get('/', {})
+        removed = 0
+        for room, roster in list(room_participants.items()):
+            if not roster:
+                room_participants.pop(room, None)
+                continue
+            members = sio_rooms.get(room, _EMPTY)
+            phantoms = [sid for sid in roster if sid not in members]
+            for sid in phantoms:
+                remove_participant_from_room(room, sid)
+            removed += len(phantoms)
+            if phantoms and room in room_participants:
+                timestamp = get_timestamp()
+                for sid in phantoms:
+                    broadcast_to_room('user_left', {
+                        'room': room,
+                        'sid': sid,
+                        'timestamp': timestamp
+                    }, room)
+        return removed
+    
+    def collect_garbage():
+        """Background task that periodically runs purge_stale_rooms()"""
+        while True:
+            socketio.sleep(GC_INTERVAL)
+            try:
+                removed = purge_stale_rooms()
+                if removed:
+                    _info('Purged %s stale participants (%s rooms tracked)', removed, len(room_participants))
+            except Exception as e:
+                _log_error(e, 'Error purging stale rooms')
+    
     # ========== CONNECTION LIFECYCLE EVENTS ==========
     
     @socketio.on('connect')
-    def on_connect():
-        """Handle client connection - Socket.IO lifecycle event"""
-        try:
-            client_id = request.sid
-            if logger:
-                logger.info(f'Client connected: {client_id}')
-            else:
-                print(f'Client connected: {client_id}')
-            
-            emit('connected', {
-                'message': 'Connected to server',
-                'sid': client_id,
-                'status': 'success'
-            })
-        except Exception as e:
-            error_msg = f'Error handling connect event: {e}'
-            if logger:
-                logger.error(error_msg, exc_info=True)
-            else:
-                print(error_msg)
-            emit('error', {'message': 'Connection error occurred'})
+    @safe_handler('connect', 'Connection error occurred')
+    def on_connect(auth=None):
+        """
+        Handle client connection - Socket.IO lifecycle event.
+        Accepts the optional auth payload explicitly so Flask-SocketIO's
+        handler(auth) call does not raise through safe_handler.
+        """
+        client_id = request.sid
+        _info('Client connected: %s', client_id)
+        
+        # Send the greeting from a background task so the handler returns and the
+        # connection is acknowledged first; the greeting follows ~1 tick later
+        socketio.start_background_task(
+            socketio.emit, 'connected', dict(_CONNECTED_TEMPLATE, sid=client_id), to=client_id
+        )
     
     @socketio.on('disconnect')
+    @safe_handler('disconnect')
     def on_disconnect():
         """Handle client disconnection - Socket.IO lifecycle event"""
-        try:
-            client_id = request.sid
-            
-            # Clean up all rooms the client was in
-            rooms_left = cleanup_client_rooms(client_id)
-            
-            if logger:
-                logger.info(f'Client disconnected: {client_id} (was in {len(rooms_left)} rooms)')
-            else:
-                print(f'Client disconnected: {client_id} (was in {len(rooms_left)} rooms)')
-        except Exception as e:
-            error_msg = f'Error handling disconnect event: {e}'
-            if logger:
-                logger.error(error_msg, exc_info=True)
-            else:
-                print(error_msg)
+        client_id = request.sid
+        
+        # Clean up all rooms the client was in
+        rooms_left = cleanup_client_rooms(client_id)
+        
+        _info('Client disconnected: %s (was in %s rooms)', client_id, len(rooms_left))
     
     # ========== TEST MESSAGE HANDLER ==========
     
     @socketio.on('test_message')
+    @safe_handler('test_message', 'Failed to process test message')
     def on_test_message(data):
         """
         Test message handler for debugging and connection verification.
@@ -144,101 +409,87 @@ def init_events(sio, log=None):
             'timestamp': optional timestamp
         }
         """
-        try:
-            client_id = request.sid
-            if logger:
-                logger.debug(f'Test message received from {client_id}: {data}')
-            else:
-                print(f'Test message received from {client_id}: {data}')
-            
-            emit('test_response', {
-                'message': 'Test message received',
-                'original_data': data,
-                'sid': client_id,
-                'status': 'success'
-            })
-        except Exception as e:
-            error_msg = f'Error handling test_message event: {e}'
-            if logger:
-                logger.error(error_msg, exc_info=True)
-            else:
-                print(error_msg)
-            emit('error', {'message': 'Failed to process test message'})
+        client_id = request.sid
+        _debug('Test message received from %s: %s', client_id, data)
+        
+        emit('test_response', {
+            'message': 'Test message received',
+            'original_data': data,
+            'sid': client_id,
+            'status': 'success'
+        })
     
     # ========== ROOM MANAGEMENT HANDLERS ==========
     
     @socketio.on('join')
+    @safe_handler('join', 'Failed to join room')
     def on_join(data):
         """
         Handle joining a chat room.
-        Tracks participants using request.sid and broadcasts participant list updates.
+        Tracks participants using request.sid; the joining client receives the full
+        participant list while other members only receive a 'user_joined' delta.
         
         Expected data format:
         {
             'room': 'room_name'
         }
         """
-        try:
-            room = data.get('room') if isinstance(data, dict) else None
-            client_id = request.sid
-            
-            if not room:
-                error_msg = 'Room name is required'
-                if logger:
-                    logger.warning(f'Join request without room from {client_id}')
-                emit('error', {'message': error_msg})
-                return
-            
-            # Validate room name (basic sanitization)
-            room = str(room).strip()
-            if not room or len(room) > 100:
-                error_msg = 'Invalid room name'
-                if logger:
-                    logger.warning(f'Invalid room name from {client_id}: {room}')
-                emit('error', {'message': error_msg})
-                return
-            
-            # Join the Socket.IO room
-            join_room(room)
-            
-            # Track participant
-            was_new_participant = client_id not in room_participants[room]
-            add_participant_to_room(room, client_id)
-            
-            # Get current participants list
-            participants = get_room_participants(room)
-            
-            if logger:
-                logger.info(f'Client {client_id} joined room: {room} ({len(participants)} participants)')
-            else:
-                print(f'Client {client_id} joined room: {room} ({len(participants)} participants)')
-            
-            # Send confirmation to the joining client
-            emit('joined', {
+        room = data.get('room') if isinstance(data, dict) else None
+        client_id = request.sid
+        
+        if not room:
+            error_msg = 'Room name is required'
+            _warn('Join request without room from %s', client_id)
+            emit('error', {'message': error_msg})
+            return
+        
+        # Validate room name (basic sanitization)
+        room = normalize_room(room)
+        if room is None:
+            error_msg = 'Invalid room name'
+            _warn('Invalid room name in join request from %s', client_id)
+            emit('error', {'message': error_msg})
+            return
+        
+        roster = room_participants.get(room)
+        if roster is None and len(room_participants) >= MAX_ROOMS:
+            error_msg = 'Room limit reached'
+            _warn('Room limit reached, rejecting join from %s', client_id)
+            emit('error', {'message': error_msg})
+            return
+        
+        # Join the Socket.IO room
+        join_room(room)
+        
+        # Track participant
+        was_new_participant = roster is None or client_id not in roster
+        add_participant_to_room(room, client_id)
+        
+        # Get current participants list
+        participants = get_room_participants(room)
+        timestamp = get_timestamp()
+        
+        _info('Client %s joined room: %s (%s participants)', client_id, room, len(participants))
+        
+        # Send confirmation to the joining client
+        emit('joined', {
+            'room': room,
+            'sid': client_id,
+            'timestamp': timestamp,
+            'participants': participants,
+            'status': 'success'
+        })
+        
+        # Notify other room members (skip the joining client)
+        if was_new_participant:
+            broadcast_to_room('user_joined', {
                 'room': room,
                 'sid': client_id,
-                'timestamp': get_timestamp(),
-                'participants': participants,
-                'status': 'success'
-            })
-            
-            # Notify other room members (skip the joining client)
-            if was_new_participant:
-                emit('user_joined', {
-                    'room': room,
-                    'sid': client_id,
-                    'timestamp': get_timestamp(),
-                    'participants': participants
-                }, room=room, skip_sid=client_id)
-        except Exception as e:
-            error_msg = f'Error handling join event: {e}'
-            if logger:
-                logger.error(error_msg, exc_info=True)
-            else:
-                print(error_msg)
-            emit('error', {'message': 'Failed to join room'})
+                'timestamp': timestamp
+            }, room, skip_sid=client_id)
     
     @socketio.on('leave')
+    @safe_handler('leave', 'Failed to leave room')
     def on_leave(data):
         """
         Handle leaving a chat room.
@@ -249,65 +500,61 @@ def init_events(sio, log=None):
             'room': 'room_name'
         }
         """
-        try:
-            room = data.get('room') if isinstance(data, dict) else None
-            client_id = request.sid
-            
-            if not room:
-                error_msg = 'Room name is required'
-                if logger:
-                    logger.warning(f'Leave request without room from {client_id}')
-                emit('error', {'message': error_msg})
-                return
-            
-            room = str(room).strip()
-            
-            # Check if client is actually in the room
-            if client_id not in room_participants.get(room, set()):
-                error_msg = 'Not a member of this room'
-                if logger:
-                    logger.warning(f'Leave request for non-member {client_id} from room {room}')
-                emit('error', {'message': error_msg})
-                return
-            
-            # Leave the Socket.IO room
-            leave_room(room)
-            
-            # Remove participant tracking
-            remove_participant_from_room(room, client_id)
-            
-            # Get updated participants list
-            participants = get_room_participants(room)
-            
-            if logger:
-                logger.info(f'Client {client_id} left room: {room} ({len(participants)} remaining)')
-            else:
-                print(f'Client {client_id} left room: {room} ({len(participants)} remaining)')
-            
-            # Send confirmation to the leaving client
-            emit('left', {
-                'room': room,
-                'sid': client_id,
-                'timestamp': get_timestamp(),
-                'status': 'success'
-            })
-            
-            # Notify remaining room members
-            emit('user_left', {
-                'room': room,
-                'sid': client_id,
-                'timestamp': get_timestamp(),
-                'participants': participants
-            }, room=room)
-        except Exception as e:
-            error_msg = f'Error handling leave event: {e}'
-            if logger:
-                logger.error(error_msg, exc_info=True)
-            else:
-                print(error_msg)
-            emit('error', {'message': 'Failed to leave room'})
+        room = data.get('room') if isinstance(data, dict) else None
+        client_id = request.sid
+        
+        if not room:
+            error_msg = 'Room name is required'
+            _warn('Leave request without room from %s', client_id)
+            emit('error', {'message': error_msg})
+            return
+        
+        room = normalize_room(room)
+        if room is None:
+            error_msg = 'Invalid room name'
+            _warn('Invalid room name in leave request from %s', client_id)
+            emit('error', {'message': error_msg})
+            return
+        
+        # Check if client is actually in the room
+        if client_id not in room_participants.get(room, _EMPTY):
+            error_msg = 'Not a member of this room'
+            _warn('Leave request for non-member %s from room %s', client_id, room)
+            emit('error', {'message': error_msg})
+            return
+        
+        # Leave the Socket.IO room
+        leave_room(room)
+        
+        # Remove participant tracking
+        remove_participant_from_room(room, client_id)
+        
+        remaining = len(room_participants.get(room, _EMPTY))
+        timestamp = get_timestamp()
+        
+        _info('Client %s left room: %s (%s remaining)', client_id, room, remaining)
+        
+        # Send confirmation to the leaving client
+        emit('left', {
+            'room': room,
+            'sid': client_id,
+            'timestamp': timestamp,
+            'status': 'success'
+        })
+        
+        # Nobody left to notify
+        if not remaining:
+            return
+        
+        # Notify remaining room members (delta only; full roster via get_participants)
+        broadcast_to_room('user_left', {
+            'room': room,
+            'sid': client_id,
+            'timestamp': timestamp
+        }, room)
     
     @socketio.on('get_participants')
+    @safe_handler('get_participants', 'Failed to get participants list')
     def on_get_participants(data):
         """
         Get the list of participants in a room.
@@ -324,40 +571,38 @@ def init_events(sio, log=None):
             'count': number of participants
         }
         """
-        try:
-            room = data.get('room') if isinstance(data, dict) else None
-            client_id = request.sid
-            
-            if not room:
-                error_msg = 'Room name is required'
-                if logger:
-                    logger.warning(f'Get participants request without room from {client_id}')
-                emit('error', {'message': error_msg})
-                return
-            
-            room = str(room).strip()
-            participants = get_room_participants(room)
-            
-            emit('participants_list', {
-                'room': room,
-                'participants': participants,
-                'count': len(participants),
-                'timestamp': get_timestamp()
-            })
-        except Exception as e:
-            error_msg = f'Error handling get_participants event: {e}'
-            if logger:
-                logger.error(error_msg, exc_info=True)
-            else:
-                print(error_msg)
-            emit('error', {'message': 'Failed to get participants list'})
+        room = data.get('room') if isinstance(data, dict) else None
+        client_id = request.sid
+        
+        if not room:
+            error_msg = 'Room name is required'
+            _warn('Get participants request without room from %s', client_id)
+            emit('error', {'message': error_msg})
+            return
+        
+        room = normalize_room(room)
+        if room is None:
+            error_msg = 'Invalid room name'
+            _warn('Invalid room name in get_participants request from %s', client_id)
+            emit('error', {'message': error_msg})
+            return
+        
+        participants = get_room_participants(room)
+        
+        emit('participants_list', {
+            'room': room,
+            'participants': participants,
+            'count': len(participants),
+            'timestamp': get_timestamp()
+        })
     
     # ========== CHAT MESSAGE HANDLER ==========
     
     @socketio.on('message')
+    @safe_handler('message', 'Failed to send message')
     def on_message(data):
         """
-        Handle chat messages and broadcast to room.
+        Handle chat messages and queue them for batched broadcast to the room.
         Automatically adds timestamp and sender ID (request.sid) to all messages.
         Validates that sender is a member of the room before broadcasting.
         
@@ -369,68 +614,72 @@ def init_events(sio, log=None):
         }
         
         Server adds:
+        - 'id': unique message id (timestamps are only millisecond precise)
         - 'timestamp': ISO format timestamp
         - 'sid': sender session ID
         """
-        try:
-            if not isinstance(data, dict):
-                error_msg = 'Invalid message format'
-                if logger:
-                    logger.warning(f'Invalid message format from {request.sid}')
-                emit('error', {'message': error_msg})
-                return
-            
-            room = data.get('room')
-            message_text = data.get('message', '').strip()
-            client_id = request.sid
-            
-            # Validate room
-            if not room:
-                error_msg = 'Room name is required'
-                if logger:
-                    logger.warning(f'Message without room from {client_id}')
-                emit('error', {'message': error_msg})
-                return
-            
-            room = str(room).strip()
-            
-            # Validate message content
-            if not message_text:
-                error_msg = 'Message content cannot be empty'
-                if logger:
-                    logger.warning(f'Empty message from {client_id} in room {room}')
-                emit('error', {'message': error_msg})
-                return
-            
-            # Check if client is a member of the room
-            if client_id not in room_participants.get(room, set()):
-                error_msg = 'You must join the room before sending messages'
-                if logger:
-                    logger.warning(f'Message from non-member {client_id} in room {room}')
+        # Cheap checks first: type, room presence and membership are validated
+        # before any string work so unauthorized senders are rejected early
+        client_id = request.sid
+        if type(data) is not dict:
+            error_msg = 'Invalid message format'
+            _warn('Invalid message format from %s', client_id)
+            emit('error', {'message': error_msg})
+            return
+        
+        # Validate room
+        room = data.get('room')
+        if not room:
+            error_msg = 'Room name is required'
+            _warn('Message without room from %s', client_id)
+            emit('error', {'message': error_msg})
+            return
+        
+        # Room keys are normalized at join time, so a canonical name hits directly;
+        # only fall back to normalization when the exact key is unknown
+        roster = room_participants.get(room) if type(room) is str else None
+        if roster is None:
+            room = normalize_room(room)
+            if room is None:
+                error_msg = 'Invalid room name'
+                _warn('Invalid room name in message request from %s', client_id)
                 emit('error', {'message': error_msg})
                 return
-            
-            # Prepare message with server-added fields
-            message_data = {
-                'room': room,
-                'message': message_text,
-                'sid': client_id,  # Sender session ID
-                'timestamp': get_timestamp(),  # Server-generated timestamp
-                'username': data.get('username'),  # Optional username from client
-            }
-            
-            if logger:
-                logger.debug(f'Message in room {room} from {client_id}: {message_text[:50]}')
-            
-            # Broadcast message to all clients in the room (including sender)
-            emit('message', message_data, room=room)
-        except Exception as e:
-            error_msg = f'Error handling message event: {e}'
-            if logger:
-                logger.error(error_msg, exc_info=True)
-            else:
-                print(error_msg)
-            emit('error', {'message': 'Failed to send message'})
+            roster = room_participants.get(room)
+        
+        # Check if client is a member of the room
+        if roster is None or client_id not in roster:
+            error_msg = 'You must join the room before sending messages'
+            _warn('Message from non-member %s in room %s', client_id, room)
+            emit('error', {'message': error_msg})
+            return
+        
+        # Validate message content
+        message_text = data.get('message')
+        if type(message_text) is not str or not (message_text := message_text.strip()):
+            error_msg = 'Message content cannot be empty'
+            _warn('Empty message from %s in room %s', client_id, room)
+            emit('error', {'message': error_msg})
+            return
+        
+        # Prepare message with server-added fields
+        message_data = {
+            'id': next(_message_ids),  # Unique message id
+            'room': room,
+            'message': message_text,
+            'sid': client_id,  # Sender session ID
+            'timestamp': get_timestamp(),  # Server-generated timestamp
+            'username': data.get('username'),  # Optional username from client
+        }
+        
+        _debug('Message in room %s from %s: %s', room, client_id, message_text[:50])
+        
+        # Queue message for the next batched broadcast to the room (including sender)
+        with pending_lock:
+            pending[room].append(message_data)
     
-    if logger:
-        logger.info('Socket.IO event handlers registered successfully')
\ No newline at end of file
+    # Start the batch flusher and the stale-room sweeper
+    socketio.start_background_task(flush_pending_messages)
+    socketio.start_background_task(collect_garbage)
+    
+    _info('Socket.IO event handlers registered successfully')
\ No newline at end of file
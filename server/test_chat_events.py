@@ -0,0 +1,147 @@
+"""
+Tests for chat_events helpers.
+
+Run from the server directory:
+    python -m unittest test_chat_events
+"""
+import logging
+import unittest
+from collections import defaultdict
+from unittest import mock
+
+import chat_events
+from chat_events import (
+    Roster,
+    normalize_room,
+    take_pending_batches,
+    MAX_ROOM_NAME_LENGTH,
+    MAX_BATCH_SIZE,
+    ROSTER_SET_THRESHOLD,
+    TRACE_INTERVAL,
+)
+
+
+class NormalizeRoomTest(unittest.TestCase):
+    def setUp(self):
+        chat_events._intern_room.cache_clear()
+
+    def test_strips_and_returns_same_object(self):
+        first = normalize_room('  main  ')
+        second = normalize_room('main')
+        self.assertEqual(first, 'main')
+        self.assertIs(first, second)
+
+    def test_rejects_empty_and_too_long(self):
+        self.assertIsNone(normalize_room('   '))
+        self.assertIsNone(normalize_room('x' * (MAX_ROOM_NAME_LENGTH + 1)))
+        self.assertEqual(normalize_room('x' * MAX_ROOM_NAME_LENGTH), 'x' * MAX_ROOM_NAME_LENGTH)
+
+    def test_invalid_names_are_not_cached(self):
+        for i in range(200):
+            self.assertIsNone(normalize_room(str(i) * 100_000))
+        self.assertIsNone(normalize_room('   '))
+        self.assertEqual(chat_events._intern_room.cache_info().currsize, 0)
+
+    def test_non_string_input(self):
+        self.assertEqual(normalize_room(42), '42')
+
+
+class RosterTest(unittest.TestCase):
+    def test_small_roster_is_a_list(self):
+        roster = Roster()
+        for i in range(ROSTER_SET_THRESHOLD):
+            roster.add(f'sid{i}')
+        roster.add('sid0')
+        self.assertIs(type(roster._data), list)
+        self.assertEqual(len(roster), ROSTER_SET_THRESHOLD)
+
+    def test_promotes_to_set_past_threshold(self):
+        roster = Roster()
+        for i in range(ROSTER_SET_THRESHOLD + 1):
+            roster.add(f'sid{i}')
+        self.assertIs(type(roster._data), set)
+        self.assertEqual(len(roster), ROSTER_SET_THRESHOLD + 1)
+        self.assertIn(f'sid{ROSTER_SET_THRESHOLD}', roster)
+
+    def test_duplicate_add_and_discard_after_promotion(self):
+        roster = Roster()
+        for i in range(ROSTER_SET_THRESHOLD + 1):
+            roster.add(f'sid{i}')
+        roster.add('sid0')
+        self.assertEqual(len(roster), ROSTER_SET_THRESHOLD + 1)
+        roster.discard('sid0')
+        roster.discard('sid0')
+        roster.discard('missing')
+        self.assertNotIn('sid0', roster)
+        self.assertEqual(len(roster), ROSTER_SET_THRESHOLD)
+        self.assertEqual(sorted(roster.to_list()), sorted(f'sid{i}' for i in range(1, ROSTER_SET_THRESHOLD + 1)))
+
+    def test_discard_from_list(self):
+        roster = Roster()
+        roster.add('a')
+        roster.discard('b')
+        roster.discard('a')
+        self.assertFalse(roster)
+        self.assertEqual(roster.to_list(), [])
+
+
+class TakePendingBatchesTest(unittest.TestCase):
+    def setUp(self):
+        chat_events.pending = defaultdict(list)
+
+    def tearDown(self):
+        chat_events.pending = defaultdict(list)
+
+    def test_empty_buffer(self):
+        self.assertEqual(take_pending_batches(), {})
+
+    def test_spills_remainder_in_order(self):
+        total = 2 * MAX_BATCH_SIZE + 44
+        chat_events.pending['main'].extend(range(total))
+        chat_events.pending['other'].append('x')
+
+        first = take_pending_batches()
+        self.assertEqual(first['main'], list(range(MAX_BATCH_SIZE)))
+        self.assertEqual(first['other'], ['x'])
+        # Messages queued after the swap land behind the spilled remainder
+        chat_events.pending['main'].append('late')
+
+        second = take_pending_batches()
+        self.assertEqual(second['main'], list(range(MAX_BATCH_SIZE, 2 * MAX_BATCH_SIZE)))
+        self.assertNotIn('other', second)
+
+        third = take_pending_batches()
+        self.assertEqual(third['main'], list(range(2 * MAX_BATCH_SIZE, total)) + ['late'])
+        self.assertEqual(take_pending_batches(), {})
+
+
+class ShouldTraceTest(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger('test_chat_events.should_trace')
+        self.logger.setLevel(logging.INFO)
+        patcher = mock.patch.object(chat_events, 'logger', self.logger)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        chat_events._seen_errs.clear()
+        self.addCleanup(chat_events._seen_errs.clear)
+
+    def _trace_at(self, now, exc_type):
+        with mock.patch.object(chat_events.time, 'monotonic', return_value=now):
+            return chat_events._should_trace(exc_type)
+
+    def test_once_per_interval_per_type(self):
+        self.assertTrue(self._trace_at(1000.0, ValueError))
+        self.assertFalse(self._trace_at(1000.0 + TRACE_INTERVAL - 1, ValueError))
+        # Other exception types are gated independently
+        self.assertTrue(self._trace_at(1001.0, KeyError))
+        self.assertTrue(self._trace_at(1000.0 + TRACE_INTERVAL, ValueError))
+        self.assertFalse(self._trace_at(1001.0 + TRACE_INTERVAL, ValueError))
+
+    def test_debug_level_always_traces(self):
+        self.logger.setLevel(logging.DEBUG)
+        for _ in range(3):
+            self.assertTrue(self._trace_at(1000.0, ValueError))
+
+
+if __name__ == '__main__':
+    unittest.main()